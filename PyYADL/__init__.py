@@ -1,3 +1,9 @@
-from .redis_lock import RedisLock, RedisWriteLock, RedisReadLock
+from .redis_lock import RedisLock, RedisWriteLock, RedisReadLock, RedisHierarchicalLock, release_many, extend_many
+from .redis_rate_limiter import RedisTokenBucketRateLimiter, RedisSlidingWindowRateLimiter
+from .redis_barrier import RedisBarrier, RedisCountDownLatch
+from .redis_sharding import RedisShardedLockManager
+from .adaptive_ttl import HoldTimeEstimator
 
-__all__ = (RedisLock, RedisWriteLock, RedisReadLock)
+__all__ = (RedisLock, RedisWriteLock, RedisReadLock, RedisHierarchicalLock, RedisTokenBucketRateLimiter,
+           RedisSlidingWindowRateLimiter, RedisBarrier, RedisCountDownLatch, RedisShardedLockManager,
+           HoldTimeEstimator, release_many, extend_many)
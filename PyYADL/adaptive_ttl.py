@@ -0,0 +1,66 @@
+from bisect import bisect_left
+from collections import OrderedDict
+from math import ceil, log
+from threading import Lock
+
+
+class HoldTimeEstimator:
+    def __init__(self, percentile=0.99, margin=1, min_ttl=1, max_ttl=3600, half_life=100, min_samples=10,
+                 max_names=1000, resolution=0.01, growth=1.25):
+        if not 0 < percentile <= 1:
+            raise ValueError('percentile must be in range (0, 1]')
+        self.percentile = percentile
+        self.margin = margin
+        self.min_ttl = min_ttl
+        self.max_ttl = max_ttl
+        self.min_samples = min_samples
+        self.max_names = max_names
+        self._decay = 0.5 ** (1 / half_life)
+        buckets = int(ceil(log(max_ttl / resolution) / log(growth))) + 1
+        self._bounds = [resolution * growth ** i for i in range(buckets)]
+        self._histograms = OrderedDict()
+        self._lock = Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = Lock()
+
+    def record(self, name, hold_time):
+        bucket = min(bisect_left(self._bounds, hold_time), len(self._bounds) - 1)
+        with self._lock:
+            histogram = self._histograms.pop(name, None)
+            if histogram is None:
+                histogram = {'weights': [0.0] * len(self._bounds), 'total': 0.0, 'samples': 0}
+                if len(self._histograms) >= self.max_names:
+                    self._histograms.popitem(last=False)
+            self._histograms[name] = histogram
+            weights = histogram['weights']
+            for index in range(len(weights)):
+                weights[index] *= self._decay
+            weights[bucket] += 1
+            histogram['total'] = histogram['total'] * self._decay + 1
+            histogram['samples'] += 1
+
+    def hold_time_percentile(self, name):
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None or histogram['samples'] < self.min_samples:
+                return None
+            threshold = histogram['total'] * self.percentile
+            cumulative = 0.0
+            for bound, weight in zip(self._bounds, histogram['weights']):
+                cumulative += weight
+                if cumulative >= threshold:
+                    return bound
+            return self._bounds[-1]
+
+    def ttl_for(self, name, default=-1):
+        hold_time = self.hold_time_percentile(name)
+        if hold_time is None:
+            return default
+        return max(self.min_ttl, min(self.max_ttl, int(ceil(hold_time + self.margin))))
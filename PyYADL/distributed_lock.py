@@ -5,30 +5,62 @@ from abc import ABCMeta, abstractmethod
 
 
 class AbstractDistributedLock(metaclass=ABCMeta):
-    def __init__(self, name, prefix=None, ttl=-1):
+    def __init__(self, name, prefix=None, ttl=-1, adaptive_ttl=None):
         self.ttl = ttl
         self.name = name
         self.prefix = prefix
+        self.adaptive_ttl = adaptive_ttl
+        self._configured_ttl = ttl
+        self._acquired_at = None
         self._secret = str(uuid4())
         self.logger = getLogger(self.__class__.__name__)
 
-    def acquire(self, blocking=True, timeout=-1):
+    def acquire(self, blocking=True, timeout=-1, cancel=None, deadline=None):
+        if cancel is not None and cancel.is_set():
+            return False
+        if self.adaptive_ttl is not None:
+            self.ttl = self.adaptive_ttl.ttl_for(self.name, self._configured_ttl)
         entered_at = time()
+        if timeout > 0:
+            deadline = entered_at + timeout if deadline is None else min(deadline, entered_at + timeout)
         while True:
             result = self._write_lock_if_not_exists()
             if result:
+                self._acquired_at = time() if self.adaptive_ttl is not None else None
                 return True
-            elif not blocking or (timeout > 0 and time() > entered_at + timeout):
+            now = time() if deadline is not None else None
+            if not blocking or (deadline is not None and now > deadline):
+                return False
+            wait = 1 if deadline is None else min(1, deadline - now)
+            if cancel is None:
+                sleep(wait)
+            elif cancel.wait(wait):
                 return False
-            sleep(1)
 
     def release(self, force=False):
-        if force or self._verify_secret():
-            result = self._delete_lock()
-            if not result:
-                raise RuntimeError('release unlocked lock')
-        else:
-            raise RuntimeError('cannot release un-acquired lock')
+        try:
+            if force or self._verify_secret():
+                result = self._delete_lock()
+                if not result:
+                    raise RuntimeError('release unlocked lock')
+            else:
+                raise RuntimeError('cannot release un-acquired lock')
+        except RuntimeError:
+            self._record_hold_time(lost=True)
+            raise
+        self._record_hold_time()
+
+    def _renew_secret(self):
+        self._secret = str(uuid4())
+
+    def _record_hold_time(self, lost=False):
+        if self.adaptive_ttl is not None and self._acquired_at is not None:
+            hold_time = time() - self._acquired_at
+            if lost and self.ttl > 0:
+                # lock expired before release, so it was held at least for whole ttl
+                hold_time = max(hold_time, self.ttl)
+            self.adaptive_ttl.record(self.name, hold_time)
+        self._acquired_at = None
 
     @abstractmethod
     def _write_lock_if_not_exists(self) -> bool:
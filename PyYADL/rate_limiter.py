@@ -0,0 +1,34 @@
+from logging import getLogger
+from time import time, sleep
+from abc import ABCMeta, abstractmethod
+
+
+class AbstractRateLimiter(metaclass=ABCMeta):
+    def __init__(self, name, prefix=None):
+        self.name = name
+        self.prefix = prefix
+        self.logger = getLogger(self.__class__.__name__)
+
+    def acquire(self, tokens=1, blocking=True, timeout=-1):
+        entered_at = time()
+        while True:
+            wait = self._take_tokens(tokens)
+            if wait <= 0:
+                return True
+            elif not blocking or (timeout > 0 and time() + wait > entered_at + timeout):
+                return False
+            sleep(wait)
+
+    @abstractmethod
+    def _take_tokens(self, tokens) -> float:
+        pass
+
+    def __enter__(self):
+        self.acquire()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+    def __str__(self):
+        return '<{0}.{1} object at {2}> prefix: {3}, name: {4}'.format(__name__, self.__class__.__name__, hex(id(self)),
+                                                                       self.prefix, self.name)
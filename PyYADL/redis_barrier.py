@@ -0,0 +1,171 @@
+from time import time
+from threading import BrokenBarrierError
+from PyYADL.redis_lock import _build_client, _build_key
+
+
+def _subscribe(client, channel):
+    pubsub = client.pubsub()
+    pubsub.subscribe(channel)
+    while True:
+        message = pubsub.get_message(timeout=None)
+        if message is not None and message['type'] == 'subscribe':
+            return pubsub
+
+
+def _next_message(pubsub, deadline):
+    while True:
+        remaining = None if deadline is None else deadline - time()
+        if remaining is not None and remaining <= 0:
+            return None
+        message = pubsub.get_message(ignore_subscribe_messages=True, timeout=remaining)
+        if message is not None and message['type'] == 'message':
+            data = message['data']
+            return data.decode('utf-8') if isinstance(data, bytes) else data
+
+
+class RedisBarrier:
+    _ARRIVE_SCRIPT = """
+        local state = redis.call('HMGET', KEYS[1], 'generation', 'broken')
+        local generation = tonumber(state[1]) or 0
+        if state[2] == '1' then
+            return {generation, -1}
+        end
+        local index = redis.call('HINCRBY', KEYS[1], 'count', 1) - 1
+        if index + 1 >= tonumber(ARGV[1]) then
+            redis.call('HMSET', KEYS[1], 'generation', generation + 1, 'count', 0)
+            redis.call('PUBLISH', KEYS[1], 'generation:' .. (generation + 1))
+        end
+        return {generation, index}
+    """
+
+    _ABORT_SCRIPT = """
+        redis.call('HSET', KEYS[1], 'broken', 1)
+        redis.call('PUBLISH', KEYS[1], 'broken:' .. (redis.call('HGET', KEYS[1], 'generation') or 0))
+    """
+
+    _RESET_SCRIPT = """
+        local state = redis.call('HMGET', KEYS[1], 'generation', 'count')
+        if (tonumber(state[2]) or 0) > 0 then
+            redis.call('PUBLISH', KEYS[1], 'broken:' .. (tonumber(state[1]) or 0))
+        end
+        redis.call('HMSET', KEYS[1], 'generation', (tonumber(state[1]) or 0) + 1, 'count', 0, 'broken', 0)
+    """
+
+    def __init__(self, name, parties, prefix=None, existing_connection_pool=None, redis_host='localhost',
+                 redis_port=6379, redis_password=None, redis_db=0, **kwargs):
+        if parties < 1:
+            raise ValueError('parties must be positive')
+        self.name = name
+        self.prefix = prefix
+        self.parties = parties
+        self._client = _build_client(existing_connection_pool, redis_host, redis_port, redis_password, redis_db,
+                                     **kwargs)
+        self.BARRIER_KEY = _build_key(self.prefix, 'barrier', self.name)
+        self._arrive_script = self._client.register_script(self._ARRIVE_SCRIPT)
+        self._abort_script = self._client.register_script(self._ABORT_SCRIPT)
+        self._reset_script = self._client.register_script(self._RESET_SCRIPT)
+
+    def wait(self, timeout=None):
+        deadline = None if timeout is None else time() + timeout
+        pubsub = _subscribe(self._client, self.BARRIER_KEY)
+        try:
+            generation, index = self._arrive_script(keys=[self.BARRIER_KEY], args=[self.parties])
+            if index < 0:
+                raise BrokenBarrierError
+            if index == self.parties - 1:
+                return index
+            while True:
+                message = _next_message(pubsub, deadline)
+                if message is None:
+                    if self._generation() > generation:
+                        return index
+                    self.abort()
+                    raise BrokenBarrierError
+                kind, message_generation = message.split(':')
+                # broken message of previous generation can arrive, when barrier has been reset before arrival
+                if kind == 'broken' and int(message_generation) >= generation:
+                    raise BrokenBarrierError
+                elif kind == 'generation' and int(message_generation) > generation:
+                    return index
+        finally:
+            pubsub.close()
+
+    def reset(self):
+        self._reset_script(keys=[self.BARRIER_KEY])
+
+    def abort(self):
+        self._abort_script(keys=[self.BARRIER_KEY])
+
+    def _generation(self):
+        return int(self._client.hget(self.BARRIER_KEY, 'generation') or 0)
+
+    @property
+    def n_waiting(self):
+        return int(self._client.hget(self.BARRIER_KEY, 'count') or 0)
+
+    @property
+    def broken(self):
+        return self._client.hget(self.BARRIER_KEY, 'broken') in (b'1', '1')
+
+    def __str__(self):
+        return '<{0}.{1} object at {2}> prefix: {3}, name: {4}, parties: {5}'.format(__name__, self.__class__.__name__,
+                                                                                     hex(id(self)), self.prefix,
+                                                                                     self.name, self.parties)
+
+
+class RedisCountDownLatch:
+    _COUNT_DOWN_SCRIPT = """
+        local count = tonumber(redis.call('GET', KEYS[1]) or ARGV[1])
+        if count > 0 then
+            count = count - 1
+            local ttl = tonumber(ARGV[2])
+            if ttl > 0 then
+                redis.call('SET', KEYS[1], count, 'EX', ttl)
+            else
+                redis.call('SET', KEYS[1], count)
+            end
+            if count == 0 then
+                redis.call('PUBLISH', KEYS[1], 'released')
+            end
+        end
+        return count
+    """
+
+    def __init__(self, name, count, prefix=None, ttl=-1, existing_connection_pool=None, redis_host='localhost',
+                 redis_port=6379, redis_password=None, redis_db=0, **kwargs):
+        if count < 0:
+            raise ValueError('count cannot be negative')
+        self.name = name
+        self.prefix = prefix
+        self.ttl = ttl
+        self.initial_count = count
+        self._client = _build_client(existing_connection_pool, redis_host, redis_port, redis_password, redis_db,
+                                     **kwargs)
+        self.LATCH_KEY = _build_key(self.prefix, 'latch', self.name)
+        self._count_down_script = self._client.register_script(self._COUNT_DOWN_SCRIPT)
+
+    def count_down(self):
+        return self._count_down_script(keys=[self.LATCH_KEY], args=[self.initial_count, self.ttl])
+
+    def reset(self):
+        self._client.delete(self.LATCH_KEY)
+
+    @property
+    def count(self):
+        count = self._client.get(self.LATCH_KEY)
+        return self.initial_count if count is None else int(count)
+
+    def wait(self, timeout=None):
+        deadline = None if timeout is None else time() + timeout
+        pubsub = _subscribe(self._client, self.LATCH_KEY)
+        try:
+            if self.count <= 0:
+                return True
+            return _next_message(pubsub, deadline) is not None
+        finally:
+            pubsub.close()
+
+    def __str__(self):
+        return '<{0}.{1} object at {2}> prefix: {3}, name: {4}, count: {5}'.format(__name__, self.__class__.__name__,
+                                                                                   hex(id(self)), self.prefix,
+                                                                                   self.name, self.initial_count)
@@ -1,30 +1,317 @@
+from os import getpid
+from atexit import register
+from weakref import WeakSet
+from pickle import dumps as pickle_dumps, PicklingError
 from time import time
 from json import dumps, loads
+from threading import Lock, RLock, Timer
 from redis import StrictRedis, ConnectionPool, WatchError
 from PyYADL.distributed_lock import AbstractDistributedLock
 
+_process_pools = {}
+_process_pools_pid = None
+_process_pools_lock = Lock()
+_lazy_holders = WeakSet()
+
+
+@register
+def _flush_lazy_holders():
+    # timer and interest listener threads are daemons, lazily held locks have to be released before they die
+    for lock in list(_lazy_holders):
+        if lock._pid == getpid():
+            try:
+                lock._flush_lazy_release()
+            except Exception:
+                lock.logger.exception('Cannot release lazily held lock %s at exit', lock.LOCK_KEY)
+
+
+def _build_connection_pool(existing_connection_pool=None, redis_host='localhost', redis_port=6379,
+                           redis_password=None, redis_db=0, **kwargs):
+    return existing_connection_pool or ConnectionPool(host=redis_host, port=redis_port, password=redis_password,
+                                                      db=redis_db, **kwargs)
+
+
+def _build_client(existing_connection_pool=None, redis_host='localhost', redis_port=6379, redis_password=None,
+                  redis_db=0, **kwargs):
+    client_connection = _build_connection_pool(existing_connection_pool, redis_host, redis_port, redis_password,
+                                               redis_db, **kwargs)
+    return StrictRedis(connection_pool=client_connection)
+
+
+# helpers which redis-py creates for every pool, new pool in unpickling process creates its own
+_POOL_INTERNAL_KWARGS = ('himport_registry', 'maint_notifications_pool_handler')
+
+
+def _connection_spec(pool):
+    kwargs = {key: value for key, value in pool.connection_kwargs.items() if key not in _POOL_INTERNAL_KWARGS}
+    unpicklable = sorted(key for key, value in kwargs.items() if not _is_picklable(value))
+    if unpicklable:
+        raise TypeError('cannot pickle lock, connection settings are not picklable: ' + ', '.join(unpicklable))
+    return pool.connection_class, pool.max_connections, kwargs
+
+
+def _is_picklable(value):
+    try:
+        pickle_dumps(value)
+    except (AttributeError, TypeError, PicklingError):
+        return False
+    return True
+
+
+def _process_connection_pool(connection_class, max_connections, connection_kwargs):
+    global _process_pools_pid
+    with _process_pools_lock:
+        if _process_pools_pid != getpid():
+            _process_pools.clear()
+            _process_pools_pid = getpid()
+        key = (connection_class, max_connections, pickle_dumps(sorted(connection_kwargs.items())))
+        if key not in _process_pools:
+            _process_pools[key] = ConnectionPool(connection_class=connection_class, max_connections=max_connections,
+                                                 **connection_kwargs)
+        return _process_pools[key]
+
+
+def _build_key(prefix, namespace, name):
+    key = ''
+    if prefix:
+        key = key + prefix + ':'
+    key = key + namespace + ':' + name
+    return key
+
 
 class RedisLock(AbstractDistributedLock):
+    _PROCESS_LOCAL_ATTRIBUTES = ('_client', '_connection_pool', '_lazy_state_lock', '_idle_timer',
+                                 '_interest_listener', '_batch_release_script', '_batch_extend_script')
+
+    _BATCH_RELEASE_SCRIPT = """
+        local value = redis.call('GET', KEYS[1])
+        if not value or cjson.decode(value)['secret'] ~= ARGV[1] then
+            return 0
+        end
+        return redis.call('DEL', KEYS[1])
+    """
+
+    _BATCH_EXTEND_SCRIPT = """
+        local value = redis.call('GET', KEYS[1])
+        if not value or cjson.decode(value)['secret'] ~= ARGV[1] then
+            return 0
+        end
+        return redis.call('EXPIRE', KEYS[1], ARGV[2])
+    """
 
     def __init__(self, name, prefix=None, ttl=-1, existing_connection_pool=None, redis_host='localhost', redis_port=6379,
-                 redis_password=None, redis_db=0, **kwargs):
-        super().__init__(name, prefix, ttl)
-        client_connection = existing_connection_pool or ConnectionPool(host=redis_host, port=redis_port,
-                                                                       password=redis_password, db=redis_db, **kwargs)
-        self._client = StrictRedis(connection_pool=client_connection)
+                 redis_password=None, redis_db=0, lazy_release=False, idle_timeout=30, adaptive_ttl=None, **kwargs):
+        super().__init__(name, prefix, ttl, adaptive_ttl)
+        self._connection_pool = _build_connection_pool(existing_connection_pool, redis_host, redis_port,
+                                                       redis_password, redis_db, **kwargs)
+        self._client = StrictRedis(connection_pool=self._connection_pool)
         self.LOCK_KEY = self._build_lock_key()
+        self.lazy_release = lazy_release
+        self.idle_timeout = idle_timeout
+        self._pid = getpid()
+        self._transferable = False
+        self._owned = False
+        self._local_deadline = None
+        self._reset_lazy_state()
+        self._register_scripts()
+
+    def __getstate__(self):
+        self._check_process()
+        state = {key: value for key, value in self.__dict__.items() if key not in self._PROCESS_LOCAL_ATTRIBUTES}
+        state['_connection_spec'] = _connection_spec(self._connection_pool)
+        state['_lazily_held'] = False
+        state['_release_requested'] = False
+        if self._transferable:
+            # handle can be unpickled only once, ownership goes with first pickled state
+            self._transferable = False
+            self._owned = False
+            self._renew_secret()
+            self._acquired_at = None
+        else:
+            del state['_secret']
+            state['_owned'] = False
+            state['_acquired_at'] = None
+        return state
+
+    def __setstate__(self, state):
+        connection_spec = state.pop('_connection_spec')
+        self.__dict__.update(state)
+        if '_secret' not in state:
+            self._renew_secret()
+        self._connection_pool = _process_connection_pool(*connection_spec)
+        self._client = StrictRedis(connection_pool=self._connection_pool)
+        self._register_scripts()
+        self._pid = getpid()
+        self._transferable = False
+        self._reset_lazy_state()
+
+    def transfer_ownership(self):
+        self._check_process()
+        with self._lazy_state_lock:
+            if not self._owned:
+                raise RuntimeError('cannot transfer un-acquired lock')
+            handle = self.__class__.__new__(self.__class__)
+            handle.__dict__.update(self.__dict__)
+            handle._reset_lazy_state()
+            handle._transferable = True
+            self._stop_lazy_holding()
+            self._renew_secret()
+            self._acquired_at = None
+        return handle
+
+    def _check_process(self):
+        if self._pid == getpid():
+            return
+        self._pid = getpid()
+        self._reset_lazy_state()
+        if self._transferable:
+            self._transferable = False
+        else:
+            self._renew_secret()
+            self._owned = False
+            self._acquired_at = None
+
+    def _reset_lazy_state(self):
+        self._lazy_state_lock = RLock()
+        self._lazily_held = False
+        self._release_requested = False
+        self._idle_timer = None
+        self._idle_deadline = None
+        self._interest_listener = None
+
+    def _register_scripts(self):
+        self._batch_release_script = self._client.register_script(self._BATCH_RELEASE_SCRIPT)
+        self._batch_extend_script = self._client.register_script(self._BATCH_EXTEND_SCRIPT)
+
+    def _queue_release(self, pipe):
+        self._batch_release_script(keys=[self.LOCK_KEY], args=[self._secret], client=pipe)
+
+    def _queue_extend(self, pipe, ttl):
+        self._batch_extend_script(keys=[self.LOCK_KEY], args=[self._secret, ttl], client=pipe)
+
+    def acquire(self, blocking=True, timeout=-1, cancel=None, deadline=None):
+        self._check_process()
+        if (cancel is None or not cancel.is_set()) and self._reacquire_lazily_held_lock():
+            return True
+        result = super().acquire(blocking, timeout, cancel, deadline)
+        if result:
+            with self._lazy_state_lock:
+                self._owned = True
+                self._release_requested = False
+                self._local_deadline = time() + self.ttl / 2 if self.ttl > 0 else None
+        return result
+
+    def release(self, force=False):
+        self._check_process()
+        if self.lazy_release and not force and self._release_lazily():
+            self._record_hold_time()
+            return
+        self._stop_lazy_holding()
+        super().release(force)
+
+    def _reacquire_lazily_held_lock(self):
+        with self._lazy_state_lock:
+            if not self._lazily_held:
+                return False
+            if self._local_deadline is None or time() < self._local_deadline:
+                self._lazily_held = False
+                self._acquired_at = time() if self.adaptive_ttl is not None else None
+                return True
+        self._flush_lazy_release()
+        return False
+
+    def _release_lazily(self):
+        with self._lazy_state_lock:
+            if not self._owned or self._release_requested:
+                return False
+            self._lazily_held = True
+            _lazy_holders.add(self)
+            if self._interest_listener is None:
+                pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(**{channel: self._on_interest for channel in self._interest_channels()})
+                self._interest_listener = pubsub.run_in_thread(sleep_time=1, daemon=True)
+            self._idle_deadline = time() + self.idle_timeout
+            if self._idle_timer is None:
+                self._start_idle_timer(self.idle_timeout)
+            return True
+
+    def _start_idle_timer(self, interval):
+        self._idle_timer = Timer(interval, self._on_idle_timer)
+        self._idle_timer.daemon = True
+        self._idle_timer.start()
+
+    def _on_idle_timer(self):
+        with self._lazy_state_lock:
+            self._idle_timer = None
+            if not self._lazily_held:
+                return
+            remaining = self._idle_deadline - time()
+            if remaining > 0:
+                self._start_idle_timer(remaining)
+            else:
+                self._flush_lazy_release()
+
+    def _on_interest(self, message):
+        with self._lazy_state_lock:
+            if self._lazily_held:
+                self._flush_lazy_release()
+            elif self._owned:
+                self._release_requested = True
+
+    def _flush_lazy_release(self):
+        with self._lazy_state_lock:
+            if not self._lazily_held:
+                return
+            self._stop_lazy_holding()
+            try:
+                super().release()
+            except RuntimeError:
+                self.logger.info('Lazily held lock %s has been lost before release', self.LOCK_KEY)
+
+    def _stop_lazy_holding(self):
+        with self._lazy_state_lock:
+            if self._idle_timer is not None:
+                self._idle_timer.cancel()
+                self._idle_timer = None
+            if self._interest_listener is not None:
+                self._interest_listener.stop()
+                self._interest_listener = None
+            _lazy_holders.discard(self)
+            self._lazily_held = False
+            self._owned = False
+
+    def _interest_channels(self):
+        return [self.LOCK_KEY + ':interest']
+
+    def _signal_interest(self, lock_data=None):
+        if lock_data is None:
+            # holder can change between attempts, so marker is read after every failed attempt
+            lazy = self._is_lazy_lock_value(self._client.get(self.LOCK_KEY))
+        else:
+            lazy = bool(lock_data.get('lazy'))
+        if lazy:
+            for channel in self._interest_channels():
+                self._client.publish(channel, self._secret)
+
+    @staticmethod
+    def _is_lazy_lock_value(raw_lock_data):
+        try:
+            return bool(loads(raw_lock_data.decode('utf-8')).get('lazy'))
+        except (AttributeError, TypeError, ValueError):
+            return False
 
     def _build_lock_key(self):
-        key = ''
-        if self.prefix:
-            key = key + self.prefix + ':'
-        key = key + 'lock:' + self.name
-        return key
+        return _build_key(self.prefix, 'lock', self.name)
 
     def _write_lock_if_not_exists(self):
-        value = dumps({'timestamp': int(time()), 'secret': self._secret, 'exclusive': True})
+        lock_data = {'timestamp': int(time()), 'secret': self._secret, 'exclusive': True}
+        if self.lazy_release:
+            lock_data['lazy'] = True
+        value = dumps(lock_data)
         ttl = self.ttl if self.ttl > 0 else None
         result = self._client.set(name=self.LOCK_KEY, value=value, ex=ttl, nx=True)
+        if not result:
+            self._signal_interest()
         return bool(result)
 
     def _verify_secret(self) -> bool:
@@ -43,6 +330,52 @@ class RedisWriteLock(RedisLock):
 
 
 class RedisReadLock(RedisLock):
+    _BATCH_RELEASE_SCRIPT = """
+        local value = redis.call('GET', KEYS[1])
+        if not value then
+            return 0
+        end
+        local lock_data = cjson.decode(value)
+        if lock_data['exclusive'] ~= false or type(lock_data['secret']) ~= 'table' then
+            return 0
+        end
+        local secrets = {}
+        for _, secret in ipairs(lock_data['secret']) do
+            if secret ~= ARGV[1] then
+                table.insert(secrets, secret)
+            end
+        end
+        if #secrets == #lock_data['secret'] then
+            return 0
+        elseif #secrets == 0 then
+            return redis.call('DEL', KEYS[1])
+        end
+        lock_data['secret'] = secrets
+        local ttl = redis.call('PTTL', KEYS[1])
+        redis.call('SET', KEYS[1], cjson.encode(lock_data))
+        if ttl > 0 then
+            redis.call('PEXPIRE', KEYS[1], ttl)
+        end
+        return 1
+    """
+
+    _BATCH_EXTEND_SCRIPT = """
+        local value = redis.call('GET', KEYS[1])
+        if not value then
+            return 0
+        end
+        local lock_data = cjson.decode(value)
+        if lock_data['exclusive'] ~= false or type(lock_data['secret']) ~= 'table' then
+            return 0
+        end
+        for _, secret in ipairs(lock_data['secret']) do
+            if secret == ARGV[1] then
+                return redis.call('EXPIRE', KEYS[1], ARGV[2])
+            end
+        end
+        return 0
+    """
+
     def _write_lock_if_not_exists(self):
         with self._client.pipeline() as pipe:
             try:
@@ -50,10 +383,13 @@ class RedisReadLock(RedisLock):
                 raw_lock_data = pipe.get(self.LOCK_KEY)
                 lock_data = loads(raw_lock_data.decode('utf-8')) if raw_lock_data else self._generate_new_lock_data()
                 if not self._is_valid_read_lock_data(lock_data):
+                    self._signal_interest(lock_data)
                     return False
 
                 lock_data['secret'] = list(set(lock_data['secret'] + [self._secret]))
                 lock_data['timestamp'] = int(time())
+                if self.lazy_release:
+                    lock_data['lazy'] = True
                 ttl = self.ttl if self.ttl > 0 else None
                 pipe.multi()
                 pipe.set(self.LOCK_KEY, value=dumps(lock_data), ex=ttl)
@@ -114,3 +450,214 @@ class RedisReadLock(RedisLock):
             except WatchError:
                 self.logger.info('Key %s has changed during transaction. Trying to retry', self.LOCK_KEY)
                 return self._delete_lock()
+
+
+class RedisHierarchicalLock(RedisLock):
+    _PROCESS_LOCAL_ATTRIBUTES = RedisLock._PROCESS_LOCAL_ATTRIBUTES + ('_acquire_script', '_release_script',
+                                                                       '_extend_script')
+    INTENTION_SHARED = 'IS'
+    INTENTION_EXCLUSIVE = 'IX'
+    SHARED = 'S'
+    EXCLUSIVE = 'X'
+
+    _HOLDERS_FUNCTIONS = """
+        if redis.replicate_commands then
+            redis.replicate_commands()
+        end
+        local function now_ms()
+            local clock = redis.call('TIME')
+            return tonumber(clock[1]) * 1000 + math.floor(tonumber(clock[2]) / 1000)
+        end
+        local function live_holders(key, now)
+            local holders = {}
+            local raw = redis.call('HGETALL', key)
+            for j = 1, #raw, 2 do
+                local intention, mode, deadline = string.match(raw[j + 1], '^(%^?)(%a+):(%d+)$')
+                deadline = tonumber(deadline)
+                if deadline > 0 and deadline <= now then
+                    redis.call('HDEL', key, raw[j])
+                else
+                    table.insert(holders, {secret = raw[j], intention = intention == '^', mode = mode})
+                end
+            end
+            return holders
+        end
+        local function refresh_expiry(key)
+            local raw = redis.call('HGETALL', key)
+            local latest = 0
+            for j = 2, #raw, 2 do
+                local deadline = tonumber(string.match(raw[j], ':(%d+)$'))
+                if deadline == 0 then
+                    redis.call('PERSIST', key)
+                    return
+                end
+                latest = math.max(latest, deadline)
+            end
+            if latest > 0 then
+                redis.call('PEXPIREAT', key, latest)
+            end
+        end
+    """
+
+    _ACQUIRE_SCRIPT = _HOLDERS_FUNCTIONS + """
+        local compatible = {
+            IS = {IS = true, IX = true, S = true},
+            IX = {IS = true, IX = true},
+            S = {IS = true, S = true},
+            X = {}
+        }
+        local secret = ARGV[1]
+        local ttl = tonumber(ARGV[4])
+        local now = now_ms()
+        for i, key in ipairs(KEYS) do
+            local mode = i == #KEYS and ARGV[2] or ARGV[3]
+            for _, holder in ipairs(live_holders(key, now)) do
+                if not compatible[mode][holder.mode] then
+                    redis.call('PUBLISH', key .. ':interest', secret)
+                    return 0
+                end
+            end
+        end
+        local deadline = ttl > 0 and now + ttl * 1000 or 0
+        for i, key in ipairs(KEYS) do
+            local mode = i == #KEYS and ARGV[2] or '^' .. ARGV[3]
+            redis.call('HSET', key, secret, mode .. ':' .. deadline)
+            refresh_expiry(key)
+        end
+        return 1
+    """
+
+    _RELEASE_SCRIPT = _HOLDERS_FUNCTIONS + """
+        local secrets = {}
+        for _, holder in ipairs(live_holders(KEYS[#KEYS], now_ms())) do
+            if not holder.intention and (ARGV[2] == '1' or holder.secret == ARGV[1]) then
+                table.insert(secrets, holder.secret)
+            end
+        end
+        if #secrets == 0 then
+            return 0
+        end
+        for _, key in ipairs(KEYS) do
+            redis.call('HDEL', key, unpack(secrets))
+            refresh_expiry(key)
+        end
+        return 1
+    """
+
+    _EXTEND_SCRIPT = _HOLDERS_FUNCTIONS + """
+        local now = now_ms()
+        local owner = false
+        for _, holder in ipairs(live_holders(KEYS[#KEYS], now)) do
+            if not holder.intention and holder.secret == ARGV[1] then
+                owner = true
+            end
+        end
+        if not owner then
+            return 0
+        end
+        local deadline = now + tonumber(ARGV[2]) * 1000
+        for _, key in ipairs(KEYS) do
+            local value = redis.call('HGET', key, ARGV[1])
+            if value then
+                redis.call('HSET', key, ARGV[1], string.match(value, '^(%^?%a+):') .. ':' .. deadline)
+                refresh_expiry(key)
+            end
+        end
+        return 1
+    """
+
+    def __init__(self, name, mode=EXCLUSIVE, separator='/', **kwargs):
+        if mode not in (self.INTENTION_SHARED, self.INTENTION_EXCLUSIVE, self.SHARED, self.EXCLUSIVE):
+            raise ValueError('unknown lock mode: {0}'.format(mode))
+        self.mode = mode
+        self.separator = separator
+        super().__init__(name, **kwargs)
+        self.PATH_KEYS = self._build_path_keys()
+
+    def _register_scripts(self):
+        self._acquire_script = self._client.register_script(self._ACQUIRE_SCRIPT)
+        self._release_script = self._client.register_script(self._RELEASE_SCRIPT)
+        self._extend_script = self._client.register_script(self._EXTEND_SCRIPT)
+
+    def _queue_release(self, pipe):
+        self._release_script(keys=self.PATH_KEYS, args=[self._secret, '0'], client=pipe)
+
+    def _queue_extend(self, pipe, ttl):
+        self._extend_script(keys=self.PATH_KEYS, args=[self._secret, ttl], client=pipe)
+
+    def _build_lock_key(self):
+        return _build_key(self.prefix, 'hlock', self.name)
+
+    def _build_path_keys(self):
+        parts = self.name.split(self.separator)
+        base = self.LOCK_KEY[:len(self.LOCK_KEY) - len(self.name)]
+        return [base + self.separator.join(parts[:depth]) for depth in range(1, len(parts) + 1)]
+
+    def _interest_channels(self):
+        return [key + ':interest' for key in self.PATH_KEYS]
+
+    def _ancestors_mode(self):
+        if self.mode in (self.SHARED, self.INTENTION_SHARED):
+            return self.INTENTION_SHARED
+        return self.INTENTION_EXCLUSIVE
+
+    def release(self, force=False):
+        if force:
+            self._check_process()
+            self._stop_lazy_holding()
+            if not self._release_script(keys=self.PATH_KEYS, args=[self._secret, '1']):
+                self._record_hold_time(lost=True)
+                raise RuntimeError('release unlocked lock')
+            self._record_hold_time()
+        else:
+            super().release()
+
+    def _write_lock_if_not_exists(self):
+        ttl = self.ttl if self.ttl > 0 else 0
+        result = self._acquire_script(keys=self.PATH_KEYS, args=[self._secret, self.mode, self._ancestors_mode(), ttl])
+        return bool(result)
+
+    def _verify_secret(self) -> bool:
+        now = int(time() * 1000)
+        direct_holders = [secret for secret, value in self._client.hgetall(self.LOCK_KEY).items()
+                          if not value.startswith(b'^') and not 0 < int(value.split(b':')[1]) <= now]
+        if not direct_holders:
+            raise RuntimeError('release unlocked lock')
+        return self._secret.encode('utf-8') in direct_holders
+
+    def _delete_lock(self):
+        return bool(self._release_script(keys=self.PATH_KEYS, args=[self._secret, '0']))
+
+
+def release_many(locks):
+    locks = list(locks)
+    for lock in locks:
+        lock._check_process()
+        lock._stop_lazy_holding()
+    results = _execute_batch(locks, lambda lock, pipe: lock._queue_release(pipe))
+    for lock, result in zip(locks, results):
+        lock._record_hold_time(lost=not result)
+    return results
+
+
+def extend_many(locks, ttl):
+    if ttl <= 0:
+        raise ValueError('ttl must be positive')
+    locks = list(locks)
+    for lock in locks:
+        lock._check_process()
+    return _execute_batch(locks, lambda lock, pipe: lock._queue_extend(pipe, ttl))
+
+
+def _execute_batch(locks, queue_command):
+    results = [False] * len(locks)
+    groups = {}
+    for index, lock in enumerate(locks):
+        groups.setdefault(id(lock._connection_pool), []).append(index)
+    for indexes in groups.values():
+        with locks[indexes[0]]._client.pipeline(transaction=False) as pipe:
+            for index in indexes:
+                queue_command(locks[index], pipe)
+            for index, result in zip(indexes, pipe.execute(raise_on_error=False)):
+                results[index] = not isinstance(result, Exception) and bool(result)
+    return results
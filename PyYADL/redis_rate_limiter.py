@@ -0,0 +1,102 @@
+from uuid import uuid4
+from abc import abstractmethod
+from PyYADL.rate_limiter import AbstractRateLimiter
+from PyYADL.redis_lock import _build_client, _build_key
+
+
+class RedisRateLimiter(AbstractRateLimiter):
+    _SCRIPT = None
+
+    def __init__(self, name, prefix=None, existing_connection_pool=None, redis_host='localhost', redis_port=6379,
+                 redis_password=None, redis_db=0, **kwargs):
+        super().__init__(name, prefix)
+        self._client = _build_client(existing_connection_pool, redis_host, redis_port, redis_password, redis_db,
+                                     **kwargs)
+        self.RATE_LIMIT_KEY = _build_key(self.prefix, 'ratelimit', self.name)
+        self._script = self._client.register_script(self._SCRIPT)
+
+    def _take_tokens(self, tokens):
+        if tokens <= 0:
+            raise ValueError('tokens must be positive')
+        return float(self._script(keys=[self.RATE_LIMIT_KEY], args=self._script_args(tokens)))
+
+    @abstractmethod
+    def _script_args(self, tokens) -> list:
+        pass
+
+
+class RedisTokenBucketRateLimiter(RedisRateLimiter):
+    _SCRIPT = """
+        local capacity = tonumber(ARGV[1])
+        local rate = tonumber(ARGV[2])
+        local requested = tonumber(ARGV[3])
+        if redis.replicate_commands then
+            redis.replicate_commands()
+        end
+        local clock = redis.call('TIME')
+        local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+        local state = redis.call('HMGET', KEYS[1], 'tokens', 'timestamp')
+        local tokens = tonumber(state[1]) or capacity
+        local timestamp = tonumber(state[2]) or now
+        tokens = math.min(capacity, tokens + math.max(0, now - timestamp) * rate)
+        local wait = 0
+        if tokens >= requested then
+            tokens = tokens - requested
+        else
+            wait = (requested - tokens) / rate
+        end
+        redis.call('HMSET', KEYS[1], 'tokens', tostring(tokens), 'timestamp', tostring(now))
+        redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000) + 1000)
+        return tostring(wait)
+    """
+
+    def __init__(self, name, capacity, rate, **kwargs):
+        if capacity <= 0 or rate <= 0:
+            raise ValueError('capacity and rate must be positive')
+        self.capacity = capacity
+        self.rate = rate
+        super().__init__(name, **kwargs)
+
+    def _script_args(self, tokens):
+        if tokens > self.capacity:
+            raise ValueError('cannot acquire more tokens than bucket capacity')
+        return [self.capacity, self.rate, tokens]
+
+
+class RedisSlidingWindowRateLimiter(RedisRateLimiter):
+    _SCRIPT = """
+        local limit = tonumber(ARGV[1])
+        local window = tonumber(ARGV[2])
+        local requested = tonumber(ARGV[3])
+        if redis.replicate_commands then
+            redis.replicate_commands()
+        end
+        local clock = redis.call('TIME')
+        local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+        redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now - window)
+        local count = redis.call('ZCARD', KEYS[1])
+        if count + requested <= limit then
+            for i = 1, requested do
+                redis.call('ZADD', KEYS[1], now, ARGV[4] .. ':' .. i)
+            end
+            redis.call('PEXPIRE', KEYS[1], math.ceil(window * 1000))
+            return '0'
+        end
+        local index = count + requested - limit - 1
+        local blocking = redis.call('ZRANGE', KEYS[1], index, index, 'WITHSCORES')
+        return tostring(tonumber(blocking[2]) + window - now)
+    """
+
+    def __init__(self, name, limit, window, **kwargs):
+        if limit <= 0 or window <= 0:
+            raise ValueError('limit and window must be positive')
+        self.limit = limit
+        self.window = window
+        super().__init__(name, **kwargs)
+
+    def _script_args(self, tokens):
+        if int(tokens) != tokens:
+            raise ValueError('tokens must be integer for sliding window')
+        if tokens > self.limit:
+            raise ValueError('cannot acquire more tokens than window limit')
+        return [self.limit, self.window, tokens, str(uuid4())]
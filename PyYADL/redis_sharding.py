@@ -0,0 +1,80 @@
+from bisect import bisect, insort
+from collections.abc import Mapping
+from hashlib import md5
+from PyYADL.redis_lock import RedisLock, RedisWriteLock, RedisReadLock, RedisHierarchicalLock
+
+
+class ConsistentHashRing:
+    def __init__(self, nodes=(), virtual_nodes=100):
+        if virtual_nodes < 1:
+            raise ValueError('virtual_nodes must be positive')
+        self.virtual_nodes = virtual_nodes
+        self._hashes = []
+        self._nodes = {}
+        for node in nodes:
+            self.add_node(node)
+
+    @staticmethod
+    def _hash(key):
+        return int.from_bytes(md5(key.encode('utf-8')).digest()[:8], 'big')
+
+    def add_node(self, node):
+        for replica in range(self.virtual_nodes):
+            point = self._hash('{0}#{1}'.format(node, replica))
+            if point not in self._nodes:
+                insort(self._hashes, point)
+            self._nodes[point] = node
+
+    def remove_node(self, node):
+        for replica in range(self.virtual_nodes):
+            point = self._hash('{0}#{1}'.format(node, replica))
+            if self._nodes.get(point) == node:
+                del self._nodes[point]
+                self._hashes.remove(point)
+
+    def get_node(self, key):
+        if not self._hashes:
+            raise RuntimeError('hash ring is empty')
+        index = bisect(self._hashes, self._hash(key)) % len(self._hashes)
+        return self._nodes[self._hashes[index]]
+
+
+class RedisShardedLockManager:
+    def __init__(self, shards, prefix=None, virtual_nodes=100):
+        self.prefix = prefix
+        if not isinstance(shards, Mapping):
+            shards = {self._shard_name(pool): pool for pool in shards}
+        self._pools = dict(shards)
+        self._ring = ConsistentHashRing(self._pools, virtual_nodes)
+
+    @staticmethod
+    def _shard_name(pool):
+        kwargs = pool.connection_kwargs
+        return '{0}:{1}/{2}'.format(kwargs.get('host', kwargs.get('path')), kwargs.get('port'), kwargs.get('db', 0))
+
+    def add_shard(self, name, pool):
+        self._pools[name] = pool
+        self._ring.add_node(name)
+
+    def remove_shard(self, name):
+        self._ring.remove_node(name)
+        del self._pools[name]
+
+    def get_connection_pool(self, name):
+        return self._pools[self._ring.get_node(name)]
+
+    def _create(self, lock_class, name, routing_name, **kwargs):
+        kwargs.setdefault('prefix', self.prefix)
+        return lock_class(name, existing_connection_pool=self.get_connection_pool(routing_name), **kwargs)
+
+    def lock(self, name, **kwargs):
+        return self._create(RedisLock, name, name, **kwargs)
+
+    def write_lock(self, name, **kwargs):
+        return self._create(RedisWriteLock, name, name, **kwargs)
+
+    def read_lock(self, name, **kwargs):
+        return self._create(RedisReadLock, name, name, **kwargs)
+
+    def hierarchical_lock(self, name, separator='/', **kwargs):
+        return self._create(RedisHierarchicalLock, name, name.split(separator)[0], separator=separator, **kwargs)
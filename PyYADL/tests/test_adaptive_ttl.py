@@ -0,0 +1,87 @@
+from unittest import TestCase
+
+from PyYADL import HoldTimeEstimator
+
+
+class TestHoldTimeEstimator(TestCase):
+
+    def test_should_return_default_ttl_when_not_enough_samples(self):
+        # given
+        estimator = HoldTimeEstimator(min_samples=5)
+        for _ in range(4):
+            estimator.record('TestLock', 3)
+
+        # when
+        result = estimator.ttl_for('TestLock', default=60)
+
+        # then
+        self.assertEqual(result, 60)
+
+    def test_should_estimate_ttl_from_percentile_and_margin(self):
+        # given
+        estimator = HoldTimeEstimator(percentile=0.8, margin=2, min_samples=5)
+        for hold_time in ([1] * 9 + [20]) * 10:
+            estimator.record('TestLock', hold_time)
+
+        # when
+        result = estimator.ttl_for('TestLock', default=60)
+
+        # then
+        self.assertEqual(result, 4)
+        self.assertEqual(estimator.ttl_for('OtherLock', default=60), 60)
+
+    def test_should_cover_long_hold_times_with_high_percentile(self):
+        # given
+        estimator = HoldTimeEstimator(percentile=0.99, margin=0, min_samples=5)
+        for hold_time in ([1] * 9 + [20]) * 10:
+            estimator.record('TestLock', hold_time)
+
+        # when
+        result = estimator.ttl_for('TestLock')
+
+        # then
+        self.assertGreaterEqual(result, 20)
+        self.assertLessEqual(result, 25)
+
+    def test_should_follow_recent_hold_times(self):
+        # given
+        estimator = HoldTimeEstimator(percentile=0.5, margin=0, half_life=10, min_samples=5)
+        for _ in range(100):
+            estimator.record('TestLock', 30)
+        for _ in range(50):
+            estimator.record('TestLock', 2)
+
+        # when
+        result = estimator.ttl_for('TestLock')
+
+        # then
+        self.assertLessEqual(result, 3)
+
+    def test_should_clamp_ttl(self):
+        # given
+        estimator = HoldTimeEstimator(margin=0, min_ttl=5, max_ttl=100, min_samples=1)
+        estimator.record('ShortLock', 0.1)
+        estimator.record('LongLock', 1000)
+
+        # when
+        short_ttl = estimator.ttl_for('ShortLock')
+        long_ttl = estimator.ttl_for('LongLock')
+
+        # then
+        self.assertEqual(short_ttl, 5)
+        self.assertEqual(long_ttl, 100)
+
+    def test_should_forget_least_recently_used_names(self):
+        # given
+        estimator = HoldTimeEstimator(min_samples=1, max_names=2)
+        estimator.record('Lock1', 1)
+        estimator.record('Lock2', 1)
+        estimator.record('Lock1', 1)
+
+        # when
+        estimator.record('Lock3', 1)
+
+        # then
+        self.assertIsNone(estimator.hold_time_percentile('Lock2'))
+        self.assertIsNotNone(estimator.hold_time_percentile('Lock1'))
+        self.assertIsNotNone(estimator.hold_time_percentile('Lock3'))
@@ -0,0 +1,187 @@
+from threading import BrokenBarrierError
+from unittest import TestCase
+from unittest.mock import patch, MagicMock
+
+from PyYADL import RedisBarrier, RedisCountDownLatch
+
+SUBSCRIBED = {'type': 'subscribe', 'data': 1}
+
+
+class TestRedisBarrier(TestCase):
+
+    @patch('PyYADL.redis_lock.StrictRedis')
+    def test_should_pass_barrier_without_waiting_when_last_party(self, mock_redis):
+        # given
+        arrive_script = MagicMock(return_value=[4, 2])
+        mock_redis.return_value.register_script.side_effect = (arrive_script, MagicMock(), MagicMock())
+        mock_redis.return_value.pubsub.return_value.get_message.side_effect = (SUBSCRIBED, )
+        barrier = RedisBarrier('TestBarrier', 3, prefix='BarrierUnitTest')
+
+        # when
+        result = barrier.wait()
+
+        # then
+        self.assertEqual(result, 2)
+        pubsub = mock_redis.return_value.pubsub.return_value
+        pubsub.subscribe.assert_called_once_with('BarrierUnitTest:barrier:TestBarrier')
+        arrive_script.assert_called_once_with(keys=['BarrierUnitTest:barrier:TestBarrier'], args=[3])
+        pubsub.close.assert_called_once_with()
+
+    @patch('PyYADL.redis_lock.StrictRedis')
+    def test_should_wait_for_next_generation_notification(self, mock_redis):
+        # given
+        mock_redis.return_value.register_script.side_effect = (MagicMock(return_value=[4, 0]), MagicMock(), MagicMock())
+        mock_redis.return_value.pubsub.return_value.get_message.side_effect = (
+            SUBSCRIBED, None, {'type': 'message', 'data': b'generation:5'})
+        barrier = RedisBarrier('TestBarrier', 3)
+
+        # when
+        result = barrier.wait()
+
+        # then
+        self.assertEqual(result, 0)
+        self.assertEqual(mock_redis.return_value.pubsub.return_value.get_message.call_count, 3)
+
+    @patch('PyYADL.redis_lock.StrictRedis')
+    def test_should_raise_exception_when_barrier_broken_while_waiting(self, mock_redis):
+        # given
+        mock_redis.return_value.register_script.side_effect = (MagicMock(return_value=[4, 0]), MagicMock(), MagicMock())
+        mock_redis.return_value.pubsub.return_value.get_message.side_effect = (
+            SUBSCRIBED, {'type': 'message', 'data': b'broken:4'})
+        barrier = RedisBarrier('TestBarrier', 3)
+
+        # when
+        with self.assertRaises(BrokenBarrierError):
+            barrier.wait()
+
+        # then
+        mock_redis.return_value.pubsub.return_value.close.assert_called_once_with()
+
+    @patch('PyYADL.redis_lock.StrictRedis')
+    def test_should_ignore_broken_notification_of_previous_generation(self, mock_redis):
+        # given
+        mock_redis.return_value.register_script.side_effect = (MagicMock(return_value=[4, 0]), MagicMock(), MagicMock())
+        mock_redis.return_value.pubsub.return_value.get_message.side_effect = (
+            SUBSCRIBED, {'type': 'message', 'data': b'broken:3'}, {'type': 'message', 'data': b'generation:5'})
+        barrier = RedisBarrier('TestBarrier', 3)
+
+        # when
+        result = barrier.wait()
+
+        # then
+        self.assertEqual(result, 0)
+
+    @patch('PyYADL.redis_lock.StrictRedis')
+    def test_should_raise_exception_when_barrier_already_broken(self, mock_redis):
+        # given
+        arrive_script = MagicMock(return_value=[4, -1])
+        mock_redis.return_value.register_script.side_effect = (arrive_script, MagicMock(), MagicMock())
+        mock_redis.return_value.pubsub.return_value.get_message.side_effect = (SUBSCRIBED, )
+        barrier = RedisBarrier('TestBarrier', 3)
+
+        # when
+        with self.assertRaises(BrokenBarrierError):
+            barrier.wait()
+
+    @patch('PyYADL.redis_lock.StrictRedis')
+    @patch('PyYADL.redis_barrier.time')
+    def test_should_break_barrier_on_timeout(self, mock_time, mock_redis):
+        # given
+        abort_script = MagicMock()
+        arrive_script = MagicMock(return_value=[4, 0])
+        mock_redis.return_value.register_script.side_effect = (arrive_script, abort_script, MagicMock())
+        mock_redis.return_value.pubsub.return_value.get_message.side_effect = (SUBSCRIBED, None)
+        mock_redis.return_value.hget.return_value = b'4'
+        mock_time.side_effect = (1504732028, 1504732028, 1504732031)
+        barrier = RedisBarrier('TestBarrier', 3)
+
+        # when
+        with self.assertRaises(BrokenBarrierError):
+            barrier.wait(timeout=2)
+
+        # then
+        abort_script.assert_called_once_with(keys=['barrier:TestBarrier'])
+
+    @patch('PyYADL.redis_lock.StrictRedis')
+    def test_should_count_down_latch(self, mock_redis):
+        # given
+        count_down_script = MagicMock(return_value=4)
+        mock_redis.return_value.register_script.return_value = count_down_script
+        latch = RedisCountDownLatch('TestLatch', 5, prefix='LatchUnitTest')
+
+        # when
+        result = latch.count_down()
+
+        # then
+        self.assertEqual(result, 4)
+        count_down_script.assert_called_once_with(keys=['LatchUnitTest:latch:TestLatch'], args=[5, -1])
+
+    @patch('PyYADL.redis_lock.StrictRedis')
+    def test_should_not_wait_when_latch_already_released(self, mock_redis):
+        # given
+        mock_redis.return_value.get.return_value = b'0'
+        mock_redis.return_value.pubsub.return_value.get_message.side_effect = (SUBSCRIBED, )
+        latch = RedisCountDownLatch('TestLatch', 5)
+
+        # when
+        result = latch.wait()
+
+        # then
+        self.assertTrue(result)
+        mock_redis.return_value.get.assert_called_once_with('latch:TestLatch')
+
+    @patch('PyYADL.redis_lock.StrictRedis')
+    def test_should_wait_for_latch_release_notification(self, mock_redis):
+        # given
+        mock_redis.return_value.get.return_value = None
+        mock_redis.return_value.pubsub.return_value.get_message.side_effect = (
+            SUBSCRIBED, {'type': 'message', 'data': b'released'})
+        latch = RedisCountDownLatch('TestLatch', 5)
+
+        # when
+        result = latch.wait(timeout=10)
+
+        # then
+        self.assertTrue(result)
+
+    @patch('PyYADL.redis_lock.StrictRedis')
+    def test_should_count_down_latch_with_ttl(self, mock_redis):
+        # given
+        count_down_script = MagicMock(return_value=4)
+        mock_redis.return_value.register_script.return_value = count_down_script
+        latch = RedisCountDownLatch('TestLatch', 5, ttl=3600)
+
+        # when
+        latch.count_down()
+
+        # then
+        count_down_script.assert_called_once_with(keys=['latch:TestLatch'], args=[5, 3600])
+
+    @patch('PyYADL.redis_lock.StrictRedis')
+    def test_should_reset_latch(self, mock_redis):
+        # given
+        mock_redis.return_value.get.return_value = None
+        latch = RedisCountDownLatch('TestLatch', 5)
+
+        # when
+        latch.reset()
+
+        # then
+        mock_redis.return_value.delete.assert_called_once_with('latch:TestLatch')
+        self.assertEqual(latch.count, 5)
+
+    @patch('PyYADL.redis_lock.StrictRedis')
+    def test_should_handle_decoded_responses(self, mock_redis):
+        # given
+        mock_redis.return_value.register_script.side_effect = (MagicMock(return_value=[4, 0]), MagicMock(), MagicMock())
+        mock_redis.return_value.pubsub.return_value.get_message.side_effect = (
+            SUBSCRIBED, {'type': 'message', 'data': 'generation:5'})
+        mock_redis.return_value.hget.return_value = '1'
+        barrier = RedisBarrier('TestBarrier', 3, decode_responses=True)
+
+        # when
+        result = barrier.wait()
+
+        # then
+        self.assertEqual(result, 0)
+        self.assertTrue(barrier.broken)
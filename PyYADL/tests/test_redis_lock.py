@@ -1,10 +1,20 @@
 from json import loads
-from unittest import TestCase
+from pickle import dumps, loads as unpickle
+from threading import Event, Lock
+from time import sleep
+from unittest import TestCase, skipIf
 from unittest.mock import patch, ANY, MagicMock
 
-from redis import WatchError
+from redis import WatchError, ConnectionPool, ResponseError
 
-from PyYADL import RedisLock, RedisWriteLock, RedisReadLock
+try:
+    import fakeredis
+except ImportError:
+    fakeredis = None
+
+from PyYADL.redis_lock import _flush_lazy_holders
+from PyYADL import RedisLock, RedisWriteLock, RedisReadLock, RedisHierarchicalLock, HoldTimeEstimator, release_many, \
+    extend_many
 
 
 class TestRedisLock(TestCase):
@@ -651,3 +661,688 @@ class TestRedisLock(TestCase):
         # then
         self.assertEqual(pipeline_verify_secret.return_value.watch.call_count, 1)
         self.assertEqual(pipeline_delete_lock.return_value.watch.call_count, 3)
+
+    @patch('PyYADL.redis_lock.StrictRedis')
+    @patch('PyYADL.distributed_lock.uuid4')
+    def test_should_acquire_hierarchical_lock_with_intention_on_ancestors(self, mock_uuid, mock_redis):
+        # given
+        mock_uuid.return_value = 'QWERTY'
+        acquire_script = MagicMock(return_value=1)
+        mock_redis.return_value.register_script.side_effect = (acquire_script, MagicMock(), MagicMock())
+        lock = RedisHierarchicalLock('table/partition/row', prefix='RedisLockUnitTest', ttl=15)
+
+        # when
+        result = lock.acquire()
+
+        # then
+        self.assertTrue(result)
+        acquire_script.assert_called_once_with(keys=['RedisLockUnitTest:hlock:table',
+                                                     'RedisLockUnitTest:hlock:table/partition',
+                                                     'RedisLockUnitTest:hlock:table/partition/row'],
+                                               args=['QWERTY', 'X', 'IX', 15])
+
+    @patch('PyYADL.redis_lock.StrictRedis')
+    @patch('PyYADL.distributed_lock.uuid4')
+    def test_should_register_shared_intention_on_ancestors_for_shared_hierarchical_lock(self, mock_uuid, mock_redis):
+        # given
+        mock_uuid.return_value = 'QWERTY'
+        acquire_script = MagicMock(return_value=1)
+        mock_redis.return_value.register_script.side_effect = (acquire_script, MagicMock(), MagicMock())
+        lock = RedisHierarchicalLock('table.partition', mode=RedisHierarchicalLock.SHARED, separator='.')
+
+        # when
+        result = lock.acquire()
+
+        # then
+        self.assertTrue(result)
+        acquire_script.assert_called_once_with(keys=['hlock:table', 'hlock:table.partition'],
+                                               args=['QWERTY', 'S', 'IS', 0])
+
+    @patch('PyYADL.redis_lock.StrictRedis')
+    @patch('PyYADL.distributed_lock.uuid4')
+    def test_should_not_acquire_hierarchical_lock_when_incompatible(self, mock_uuid, mock_redis):
+        # given
+        mock_uuid.return_value = 'QWERTY'
+        acquire_script = MagicMock(return_value=0)
+        mock_redis.return_value.register_script.side_effect = (acquire_script, MagicMock(), MagicMock())
+        lock = RedisHierarchicalLock('table/partition')
+
+        # when
+        result = lock.acquire(blocking=False)
+
+        # then
+        self.assertFalse(result)
+        acquire_script.assert_called_once_with(keys=['hlock:table', 'hlock:table/partition'],
+                                               args=['QWERTY', 'X', 'IX', 0])
+
+    def test_should_raise_exception_on_unknown_hierarchical_lock_mode(self):
+        with self.assertRaisesRegex(ValueError, 'unknown lock mode: Z'):
+            RedisHierarchicalLock('table', mode='Z')
+
+    @patch('PyYADL.redis_lock.StrictRedis')
+    @patch('PyYADL.distributed_lock.uuid4')
+    def test_should_release_hierarchical_lock(self, mock_uuid, mock_redis):
+        # given
+        mock_uuid.return_value = 'QWERTY'
+        release_script = MagicMock(return_value=1)
+        mock_redis.return_value.register_script.side_effect = (MagicMock(), release_script, MagicMock())
+        mock_redis.return_value.hgetall.return_value = {b'QWERTY': b'X:0', b'other': b'^IX:0'}
+        lock = RedisHierarchicalLock('table/partition')
+
+        # when
+        lock.release()
+
+        # then
+        mock_redis.return_value.hgetall.assert_called_once_with('hlock:table/partition')
+        release_script.assert_called_once_with(keys=['hlock:table', 'hlock:table/partition'], args=['QWERTY', '0'])
+
+    @patch('PyYADL.redis_lock.StrictRedis')
+    @patch('PyYADL.distributed_lock.uuid4')
+    def test_should_not_release_hierarchical_lock_held_only_as_intention(self, mock_uuid, mock_redis):
+        # given
+        mock_uuid.return_value = 'QWERTY'
+        release_script = MagicMock(return_value=1)
+        mock_redis.return_value.register_script.side_effect = (MagicMock(), release_script, MagicMock())
+        mock_redis.return_value.hgetall.return_value = {b'QWERTY': b'^IX:0', b'other': b'S:0'}
+        lock = RedisHierarchicalLock('table/partition')
+
+        # when
+        with self.assertRaisesRegex(RuntimeError, 'cannot release un-acquired lock'):
+            lock.release()
+
+        # then
+        release_script.assert_not_called()
+
+    @patch('PyYADL.redis_lock.StrictRedis')
+    @patch('PyYADL.distributed_lock.uuid4')
+    def test_should_release_hierarchical_lock_owned_by_other_instance_when_force(self, mock_uuid, mock_redis):
+        # given
+        mock_uuid.return_value = 'QWERTY'
+        release_script = MagicMock(return_value=1)
+        mock_redis.return_value.register_script.side_effect = (MagicMock(), release_script, MagicMock())
+        lock = RedisHierarchicalLock('table/partition')
+
+        # when
+        lock.release(force=True)
+
+        # then
+        mock_redis.return_value.hgetall.assert_not_called()
+        release_script.assert_called_once_with(keys=['hlock:table', 'hlock:table/partition'], args=['QWERTY', '1'])
+
+    @patch('PyYADL.redis_lock.Timer')
+    @patch('PyYADL.redis_lock.StrictRedis')
+    @patch('PyYADL.distributed_lock.uuid4')
+    def test_should_keep_lock_on_lazy_release_and_reacquire_without_network(self, mock_uuid, mock_redis, mock_timer):
+        # given
+        mock_uuid.return_value = 'QWERTY'
+        mock_redis.return_value.set.return_value = True
+        lock = RedisLock(name='TestLock', prefix='RedisLockUnitTest', lazy_release=True, idle_timeout=5)
+
+        # when
+        lock.acquire()
+        lock.release()
+        result = lock.acquire()
+        lock.release()
+
+        # then
+        self.assertTrue(result)
+        mock_redis.return_value.set.assert_called_once_with(ex=None, name='RedisLockUnitTest:lock:TestLock', nx=True,
+                                                            value=ANY)
+        value = mock_redis.return_value.set.mock_calls[0][2].get('value')
+        self.assertTrue(loads(value).get('lazy'))
+        mock_redis.return_value.delete.assert_not_called()
+        mock_redis.return_value.pubsub.return_value.subscribe.assert_called_once_with(
+            **{'RedisLockUnitTest:lock:TestLock:interest': ANY})
+        mock_timer.assert_called_once_with(5, ANY)
+        mock_timer.return_value.cancel.assert_not_called()
+
+    @patch('PyYADL.redis_lock.Timer')
+    @patch('PyYADL.redis_lock.StrictRedis')
+    @patch('PyYADL.distributed_lock.uuid4')
+    def test_should_release_lazily_held_lock_when_other_client_is_interested(self, mock_uuid, mock_redis, mock_timer):
+        # given
+        mock_uuid.return_value = 'QWERTY'
+        mock_redis.return_value.set.return_value = True
+        mock_redis.return_value.get.return_value = b'{"secret": "QWERTY", "timestamp": 1504732028}'
+        mock_redis.return_value.delete.return_value = 1
+        lock = RedisLock(name='TestLock', prefix='RedisLockUnitTest', lazy_release=True)
+        lock.acquire()
+        lock.release()
+
+        # when
+        lock._on_interest({'type': 'message', 'data': b'other'})
+
+        # then
+        mock_redis.return_value.delete.assert_called_once_with('RedisLockUnitTest:lock:TestLock')
+        mock_redis.return_value.pubsub.return_value.run_in_thread.return_value.stop.assert_called_once_with()
+        mock_timer.return_value.cancel.assert_called_once_with()
+
+    @patch('PyYADL.redis_lock.Timer')
+    @patch('PyYADL.redis_lock.StrictRedis')
+    @patch('PyYADL.distributed_lock.uuid4')
+    def test_should_release_lazily_held_locks_at_exit(self, mock_uuid, mock_redis, mock_timer):
+        # given
+        mock_uuid.side_effect = ('QWERTY', 'ASDFGH')
+        mock_redis.return_value.set.return_value = True
+        mock_redis.return_value.get.return_value = b'{"secret": "QWERTY", "timestamp": 1504732028}'
+        mock_redis.return_value.delete.return_value = 1
+        lock = RedisLock(name='TestLock', prefix='RedisLockUnitTest', lazy_release=True)
+        lock.acquire()
+        lock.release()
+        held_lock = RedisLock(name='OtherLock', prefix='RedisLockUnitTest', lazy_release=True)
+        held_lock.acquire()
+
+        # when
+        _flush_lazy_holders()
+
+        # then
+        mock_redis.return_value.delete.assert_called_once_with('RedisLockUnitTest:lock:TestLock')
+        mock_timer.return_value.cancel.assert_called_once_with()
+
+    @patch('PyYADL.redis_lock.Timer')
+    @patch('PyYADL.redis_lock.StrictRedis')
+    @patch('PyYADL.distributed_lock.uuid4')
+    def test_should_release_immediately_when_interest_signalled_while_held(self, mock_uuid, mock_redis, mock_timer):
+        # given
+        mock_uuid.return_value = 'QWERTY'
+        mock_redis.return_value.set.return_value = True
+        mock_redis.return_value.get.return_value = b'{"secret": "QWERTY", "timestamp": 1504732028}'
+        mock_redis.return_value.delete.return_value = 1
+        lock = RedisLock(name='TestLock', prefix='RedisLockUnitTest', lazy_release=True)
+        lock.acquire()
+
+        # when
+        lock._on_interest({'type': 'message', 'data': b'other'})
+        lock.release()
+
+        # then
+        mock_redis.return_value.delete.assert_called_once_with('RedisLockUnitTest:lock:TestLock')
+        mock_timer.assert_not_called()
+
+    @patch('PyYADL.redis_lock.StrictRedis')
+    @patch('PyYADL.distributed_lock.uuid4')
+    def test_should_signal_interest_when_lock_is_lazily_held(self, mock_uuid, mock_redis):
+        # given
+        mock_uuid.return_value = 'QWERTY'
+        mock_redis.return_value.set.return_value = False
+        mock_redis.return_value.get.return_value = b'{"secret": "ABCDE", "exclusive": true, "lazy": true}'
+        lock = RedisLock(name='TestLock', prefix='RedisLockUnitTest')
+
+        # when
+        result = lock.acquire(blocking=False)
+
+        # then
+        self.assertFalse(result)
+        mock_redis.return_value.publish.assert_called_once_with('RedisLockUnitTest:lock:TestLock:interest', 'QWERTY')
+
+    @patch('PyYADL.redis_lock.StrictRedis')
+    @patch('PyYADL.distributed_lock.uuid4')
+    @patch('PyYADL.distributed_lock.sleep')
+    def test_should_not_signal_interest_when_lock_is_not_lazy(self, mock_sleep, mock_uuid, mock_redis):
+        # given
+        mock_uuid.return_value = 'QWERTY'
+        mock_redis.return_value.set.side_effect = (False, False, True)
+        mock_redis.return_value.get.return_value = b'{"secret": "ABCDE", "exclusive": true}'
+        lock = RedisLock(name='TestLock', prefix='RedisLockUnitTest')
+
+        # when
+        result = lock.acquire()
+
+        # then
+        self.assertTrue(result)
+        self.assertEqual(mock_redis.return_value.get.call_count, 2)
+        mock_redis.return_value.publish.assert_not_called()
+
+    @patch('PyYADL.redis_lock.StrictRedis')
+    @patch('PyYADL.distributed_lock.uuid4')
+    @patch('PyYADL.distributed_lock.sleep')
+    def test_should_signal_interest_when_lazy_holder_took_lock_while_waiting(self, mock_sleep, mock_uuid, mock_redis):
+        # given
+        mock_uuid.return_value = 'QWERTY'
+        mock_redis.return_value.set.side_effect = (False, False, True)
+        mock_redis.return_value.get.side_effect = (b'{"secret": "ABCDE", "exclusive": true}',
+                                                   b'{"secret": "ZXCVB", "exclusive": true, "lazy": true}')
+        lock = RedisLock(name='TestLock', prefix='RedisLockUnitTest')
+
+        # when
+        result = lock.acquire()
+
+        # then
+        self.assertTrue(result)
+        mock_redis.return_value.publish.assert_called_once_with('RedisLockUnitTest:lock:TestLock:interest', 'QWERTY')
+
+    @patch('PyYADL.redis_lock.Timer')
+    @patch('PyYADL.redis_lock.StrictRedis')
+    @patch('PyYADL.distributed_lock.uuid4')
+    @patch('PyYADL.redis_lock.time')
+    def test_should_rearm_idle_timer_when_lock_used_in_meantime(self, mock_time, mock_uuid, mock_redis, mock_timer):
+        # given
+        mock_uuid.return_value = 'QWERTY'
+        mock_redis.return_value.set.return_value = True
+        lock = RedisLock(name='TestLock', lazy_release=True, idle_timeout=5)
+        mock_time.return_value = 100
+        lock.acquire()
+        lock.release()
+        mock_time.return_value = 103
+        lock.acquire()
+        lock.release()
+
+        # when
+        mock_time.return_value = 105
+        lock._on_idle_timer()
+
+        # then
+        self.assertEqual(mock_timer.mock_calls[0][1][0], 5)
+        mock_timer.assert_called_with(3, ANY)
+        self.assertEqual(mock_timer.call_count, 2)
+        mock_redis.return_value.delete.assert_not_called()
+
+    @patch('PyYADL.redis_lock.StrictRedis')
+    @patch('PyYADL.distributed_lock.uuid4')
+    def test_should_acquire_lock_with_adaptive_ttl(self, mock_uuid, mock_redis):
+        # given
+        mock_uuid.return_value = 'SecretData'
+        estimator = MagicMock()
+        estimator.ttl_for.return_value = 7
+        lock = RedisLock(name='TestLock', prefix='RedisLockUnitTest', ttl=60, adaptive_ttl=estimator)
+        mock_redis.return_value.set.return_value = True
+
+        # when
+        result = lock.acquire()
+
+        # then
+        self.assertTrue(result)
+        estimator.ttl_for.assert_called_once_with('TestLock', 60)
+        mock_redis.return_value.set.assert_called_once_with(ex=7, name='RedisLockUnitTest:lock:TestLock', nx=True,
+                                                            value=ANY)
+
+    @patch('PyYADL.redis_lock.StrictRedis')
+    @patch('PyYADL.distributed_lock.uuid4')
+    @patch('PyYADL.distributed_lock.time')
+    def test_should_record_hold_time_on_release(self, mock_time, mock_uuid, mock_redis):
+        # given
+        mock_uuid.return_value = 'SecretData'
+        mock_time.side_effect = (1504732028, 1504732028, 1504732031.5)
+        estimator = HoldTimeEstimator(min_samples=1)
+        lock = RedisLock(name='TestLock', adaptive_ttl=estimator)
+        mock_redis.return_value.set.return_value = True
+        mock_redis.return_value.get.return_value = b'{"secret": "SecretData", "timestamp": 1504732028}'
+        mock_redis.return_value.delete.return_value = 1
+
+        # when
+        lock.acquire()
+        lock.release()
+
+        # then
+        hold_time = estimator.hold_time_percentile('TestLock')
+        self.assertTrue(3.5 <= hold_time < 3.5 * 1.25)
+
+    @patch('PyYADL.redis_lock.StrictRedis')
+    @patch('PyYADL.distributed_lock.uuid4')
+    @patch('PyYADL.distributed_lock.time')
+    def test_should_raise_adaptive_ttl_when_lock_expired_before_release(self, mock_time, mock_uuid, mock_redis):
+        # given
+        mock_uuid.return_value = 'SecretData'
+        mock_time.side_effect = (1504732028, 1504732028, 1504732028.2, 1504732040, 1504732040, 1504732041.2)
+        estimator = HoldTimeEstimator(min_samples=1, margin=0.5)
+        lock = RedisLock(name='TestLock', adaptive_ttl=estimator)
+        mock_redis.return_value.set.return_value = True
+        mock_redis.return_value.get.return_value = b'{"secret": "SecretData", "timestamp": 1504732028}'
+        mock_redis.return_value.delete.return_value = 1
+        lock.acquire()
+        lock.release()
+        ttl = estimator.ttl_for('TestLock')
+        mock_redis.return_value.get.return_value = None
+
+        # when
+        lock.acquire()
+        with self.assertRaisesRegex(RuntimeError, 'release unlocked lock'):
+            lock.release()
+
+        # then
+        self.assertEqual(ttl, 1)
+        self.assertEqual(lock.ttl, 1)
+        self.assertGreater(estimator.ttl_for('TestLock'), ttl)
+
+    @patch('PyYADL.redis_lock.StrictRedis')
+    @patch('PyYADL.distributed_lock.uuid4')
+    def test_should_unpickle_lock_as_new_unowned_handle(self, mock_uuid, mock_redis):
+        # given
+        mock_uuid.side_effect = ('QWERTY', 'ASDFGH', 'ZXCVBN')
+        mock_redis.return_value.set.return_value = True
+        lock = RedisLock(name='TestLock', prefix='RedisLockUnitTest', ttl=15,
+                         existing_connection_pool=ConnectionPool(host='redis1', port=6380, db=2))
+        lock.acquire()
+
+        # when
+        copied = unpickle(dumps(lock))
+
+        # then
+        self.assertEqual(copied._secret, 'ASDFGH')
+        self.assertEqual(copied.LOCK_KEY, 'RedisLockUnitTest:lock:TestLock')
+        self.assertEqual(copied.ttl, 15)
+        self.assertFalse(copied._owned)
+        pool = mock_redis.call_args[1]['connection_pool']
+        self.assertEqual((pool.connection_kwargs['host'], pool.connection_kwargs['port']), ('redis1', 6380))
+        self.assertIs(unpickle(dumps(lock))._connection_pool, pool)
+
+    @patch('PyYADL.redis_lock.StrictRedis')
+    @patch('PyYADL.distributed_lock.uuid4')
+    def test_should_transfer_lock_ownership(self, mock_uuid, mock_redis):
+        # given
+        mock_uuid.side_effect = ('QWERTY', 'ASDFGH', 'ZXCVBN')
+        mock_redis.return_value.set.return_value = True
+        mock_redis.return_value.get.return_value = b'{"secret": "QWERTY", "timestamp": 1504732028}'
+        mock_redis.return_value.delete.return_value = 1
+        lock = RedisLock(name='TestLock', existing_connection_pool=ConnectionPool())
+        lock.acquire()
+
+        # when
+        handle = unpickle(dumps(lock.transfer_ownership()))
+
+        # then
+        self.assertEqual(handle._secret, 'QWERTY')
+        self.assertEqual(lock._secret, 'ASDFGH')
+        with self.assertRaisesRegex(RuntimeError, 'cannot release un-acquired lock'):
+            lock.release()
+        handle.release()
+        mock_redis.return_value.delete.assert_called_once_with('lock:TestLock')
+
+    @patch('PyYADL.redis_lock.StrictRedis')
+    @patch('PyYADL.distributed_lock.uuid4')
+    def test_should_transfer_lock_ownership_only_once(self, mock_uuid, mock_redis):
+        # given
+        mock_uuid.side_effect = ('QWERTY', 'ASDFGH', 'ZXCVBN', 'POIUYT')
+        mock_redis.return_value.set.return_value = True
+        lock = RedisLock(name='TestLock', existing_connection_pool=ConnectionPool())
+        lock.acquire()
+        handle = lock.transfer_ownership()
+
+        # when
+        first_handle = unpickle(dumps(handle))
+        second_handle = unpickle(dumps(handle))
+
+        # then
+        self.assertEqual(first_handle._secret, 'QWERTY')
+        self.assertTrue(first_handle._owned)
+        self.assertEqual(second_handle._secret, 'POIUYT')
+        self.assertFalse(second_handle._owned)
+        self.assertFalse(handle._owned)
+        self.assertNotEqual(handle._secret, 'QWERTY')
+
+    @patch('PyYADL.redis_lock.StrictRedis')
+    def test_should_keep_connection_pool_of_transferred_lock_in_process(self, mock_redis):
+        # given
+        mock_redis.return_value.set.return_value = True
+        connection_pool = ConnectionPool(max_connections=3)
+        lock = RedisLock(name='TestLock', existing_connection_pool=connection_pool)
+        lock.acquire()
+
+        # when
+        handle = lock.transfer_ownership()
+
+        # then
+        self.assertIs(handle._connection_pool, connection_pool)
+        self.assertTrue(handle._owned)
+
+    @patch('PyYADL.redis_lock.StrictRedis')
+    def test_should_keep_connection_settings_of_unpickled_lock(self, mock_redis):
+        # given
+        lock = RedisLock(name='TestLock', existing_connection_pool=ConnectionPool(max_connections=3, db=2))
+
+        # when
+        unpickled = unpickle(dumps(lock))
+
+        # then
+        self.assertEqual(unpickled._connection_pool.max_connections, 3)
+        self.assertEqual(unpickled._connection_pool.connection_kwargs['db'], 2)
+
+    @patch('PyYADL.redis_lock.StrictRedis')
+    def test_should_raise_exception_when_pickling_lock_with_unpicklable_connection_settings(self, mock_redis):
+        # given
+        lock = RedisLock(name='TestLock', existing_connection_pool=ConnectionPool(credential_provider=Lock()))
+
+        # when
+        with self.assertRaisesRegex(TypeError, 'connection settings are not picklable: credential_provider'):
+            dumps(lock)
+
+    @patch('PyYADL.redis_lock.StrictRedis')
+    def test_should_raise_exception_when_transferring_un_acquired_lock(self, mock_redis):
+        # given
+        lock = RedisLock(name='TestLock')
+
+        # when
+        with self.assertRaisesRegex(RuntimeError, 'cannot transfer un-acquired lock'):
+            lock.transfer_ownership()
+
+    @patch('PyYADL.redis_lock.StrictRedis')
+    @patch('PyYADL.distributed_lock.uuid4')
+    @patch('PyYADL.redis_lock.getpid')
+    def test_should_drop_ownership_of_lock_inherited_by_forked_process(self, mock_getpid, mock_uuid, mock_redis):
+        # given
+        mock_getpid.return_value = 100
+        mock_uuid.side_effect = ('QWERTY', 'ASDFGH', 'ZXCVBN', 'POIUYT')
+        mock_redis.return_value.set.return_value = True
+        lock = RedisLock(name='TestLock', existing_connection_pool=ConnectionPool())
+        lock.acquire()
+        other_lock = RedisLock(name='OtherLock', existing_connection_pool=ConnectionPool())
+        other_lock.acquire()
+        handle = other_lock.transfer_ownership()
+
+        # when
+        mock_getpid.return_value = 200
+        lock._check_process()
+        handle._check_process()
+
+        # then
+        self.assertEqual(lock._secret, 'POIUYT')
+        self.assertFalse(lock._owned)
+        self.assertEqual(handle._secret, 'ASDFGH')
+        self.assertTrue(handle._owned)
+
+    @patch('PyYADL.redis_lock.StrictRedis')
+    @patch('PyYADL.distributed_lock.uuid4')
+    def test_should_release_many_locks_in_single_pipeline(self, mock_uuid, mock_redis):
+        # given
+        mock_uuid.side_effect = ('QWERTY', 'ASDFGH')
+        pipeline = MagicMock()
+        pipeline.return_value.execute.return_value = [1, 0]
+        mock_redis.return_value.pipeline.return_value.__enter__ = pipeline
+        mock_redis.return_value.register_script.side_effect = lambda script: MagicMock()
+        pool = ConnectionPool()
+        lock = RedisLock('TestLock', prefix='RedisLockUnitTest', existing_connection_pool=pool)
+        read_lock = RedisReadLock('OtherLock', prefix='RedisLockUnitTest', existing_connection_pool=pool)
+
+        # when
+        result = release_many([lock, read_lock])
+
+        # then
+        self.assertListEqual(result, [True, False])
+        mock_redis.return_value.pipeline.assert_called_once_with(transaction=False)
+        pipeline.return_value.execute.assert_called_once_with(raise_on_error=False)
+        lock._batch_release_script.assert_called_once_with(keys=['RedisLockUnitTest:lock:TestLock'], args=['QWERTY'],
+                                                           client=pipeline.return_value)
+        read_lock._batch_release_script.assert_called_once_with(keys=['RedisLockUnitTest:lock:OtherLock'],
+                                                                args=['ASDFGH'], client=pipeline.return_value)
+        mock_redis.return_value.delete.assert_not_called()
+
+    @patch('PyYADL.redis_lock.StrictRedis')
+    @patch('PyYADL.distributed_lock.uuid4')
+    def test_should_use_pipeline_per_connection_pool(self, mock_uuid, mock_redis):
+        # given
+        mock_uuid.side_effect = ('QWERTY', 'ASDFGH', 'ZXCVBN')
+        pipeline = MagicMock()
+        pipeline.return_value.execute.side_effect = ([1, 1], [0])
+        mock_redis.return_value.pipeline.return_value.__enter__ = pipeline
+        pool1 = ConnectionPool(host='redis1')
+        pool2 = ConnectionPool(host='redis2')
+        locks = [RedisLock('Lock1', existing_connection_pool=pool1), RedisLock('Lock2', existing_connection_pool=pool2),
+                 RedisLock('Lock3', existing_connection_pool=pool1)]
+
+        # when
+        result = release_many(locks)
+
+        # then
+        self.assertListEqual(result, [True, False, True])
+        self.assertEqual(pipeline.return_value.execute.call_count, 2)
+
+    @patch('PyYADL.redis_lock.StrictRedis')
+    @patch('PyYADL.distributed_lock.uuid4')
+    def test_should_extend_many_locks_in_single_pipeline(self, mock_uuid, mock_redis):
+        # given
+        mock_uuid.side_effect = ('QWERTY', 'ASDFGH')
+        pipeline = MagicMock()
+        pipeline.return_value.execute.return_value = [1, 1]
+        mock_redis.return_value.pipeline.return_value.__enter__ = pipeline
+        mock_redis.return_value.register_script.side_effect = lambda script: MagicMock()
+        pool = ConnectionPool()
+        lock = RedisLock('TestLock', existing_connection_pool=pool)
+        hierarchical_lock = RedisHierarchicalLock('table/row', existing_connection_pool=pool)
+
+        # when
+        result = extend_many([lock, hierarchical_lock], 30)
+
+        # then
+        self.assertListEqual(result, [True, True])
+        lock._batch_extend_script.assert_called_once_with(keys=['lock:TestLock'], args=['QWERTY', 30],
+                                                          client=pipeline.return_value)
+        hierarchical_lock._extend_script.assert_called_once_with(keys=['hlock:table', 'hlock:table/row'],
+                                                                 args=['ASDFGH', 30], client=pipeline.return_value)
+
+    @patch('PyYADL.redis_lock.StrictRedis')
+    def test_should_report_lock_as_not_released_when_its_script_failed(self, mock_redis):
+        # given
+        pipeline = MagicMock()
+        pipeline.return_value.execute.return_value = [ResponseError('WRONGTYPE'), 1]
+        mock_redis.return_value.pipeline.return_value.__enter__ = pipeline
+        pool = ConnectionPool()
+        locks = [RedisLock('Lock1', existing_connection_pool=pool), RedisLock('Lock2', existing_connection_pool=pool)]
+
+        # when
+        result = release_many(locks)
+
+        # then
+        self.assertListEqual(result, [False, True])
+
+    @patch('PyYADL.redis_lock.StrictRedis')
+    def test_should_raise_exception_when_extending_many_locks_with_non_positive_ttl(self, mock_redis):
+        # given
+        lock = RedisLock('TestLock')
+
+        # when
+        with self.assertRaisesRegex(ValueError, 'ttl must be positive'):
+            extend_many([lock], 0)
+
+        # then
+        mock_redis.return_value.pipeline.assert_not_called()
+
+    @patch('PyYADL.redis_lock.StrictRedis')
+    @patch('PyYADL.distributed_lock.sleep')
+    def test_should_not_try_to_acquire_lock_when_already_cancelled(self, mock_sleep, mock_redis):
+        # given
+        cancel = Event()
+        cancel.set()
+        lock = RedisLock(name='TestLock', prefix='RedisLockUnitTest')
+
+        # when
+        result = lock.acquire(cancel=cancel)
+
+        # then
+        self.assertFalse(result)
+        mock_redis.return_value.set.assert_not_called()
+        mock_sleep.assert_not_called()
+
+    @patch('PyYADL.redis_lock.StrictRedis')
+    @patch('PyYADL.distributed_lock.sleep')
+    def test_should_stop_waiting_for_lock_when_cancelled(self, mock_sleep, mock_redis):
+        # given
+        cancel = MagicMock()
+        cancel.is_set.return_value = False
+        cancel.wait.side_effect = (False, True)
+        mock_redis.return_value.set.return_value = False
+        lock = RedisLock(name='TestLock', prefix='RedisLockUnitTest')
+
+        # when
+        result = lock.acquire(cancel=cancel)
+
+        # then
+        self.assertFalse(result)
+        self.assertEqual(mock_redis.return_value.set.call_count, 2)
+        self.assertEqual(cancel.wait.call_count, 2)
+        cancel.wait.assert_called_with(1)
+        mock_sleep.assert_not_called()
+
+    @patch('PyYADL.redis_lock.StrictRedis')
+    @patch('PyYADL.distributed_lock.sleep')
+    @patch('PyYADL.distributed_lock.time')
+    def test_should_wait_until_deadline(self, mock_time, mock_sleep, mock_redis):
+        # given
+        mock_time.side_effect = (1504732028, 1504732028, 1504732029, 1504732029.75, 1504732030.5)
+        mock_redis.return_value.set.return_value = False
+        lock = RedisLock(name='TestLock', prefix='RedisLockUnitTest')
+
+        # when
+        result = lock.acquire(deadline=1504732030)
+
+        # then
+        self.assertFalse(result)
+        self.assertEqual(mock_redis.return_value.set.call_count, 4)
+        self.assertEqual([c[1][0] for c in mock_sleep.mock_calls], [1, 1, 0.25])
+
+    @patch('PyYADL.redis_lock.StrictRedis')
+    @patch('PyYADL.distributed_lock.sleep')
+    @patch('PyYADL.distributed_lock.time')
+    def test_should_use_earlier_of_deadline_and_timeout(self, mock_time, mock_sleep, mock_redis):
+        # given
+        mock_time.side_effect = (1504732028, 1504732028.5, 1504732029.5)
+        mock_redis.return_value.set.return_value = False
+        lock = RedisLock(name='TestLock', prefix='RedisLockUnitTest')
+
+        # when
+        result = lock.acquire(timeout=60, deadline=1504732029)
+
+        # then
+        self.assertFalse(result)
+        self.assertEqual(mock_redis.return_value.set.call_count, 2)
+        mock_sleep.assert_called_once_with(0.5)
+
+
+@skipIf(fakeredis is None, 'fakeredis is not installed')
+class TestRedisHierarchicalLockScripts(TestCase):
+
+    def setUp(self):
+        server = fakeredis.FakeServer()
+        self.client = fakeredis.FakeStrictRedis(server=server)
+        patcher = patch('PyYADL.redis_lock.StrictRedis',
+                        side_effect=lambda connection_pool: fakeredis.FakeStrictRedis(server=server))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_should_expire_holder_with_ttl_when_sharing_ancestor_with_holder_without_ttl(self):
+        # given
+        row_with_ttl = RedisHierarchicalLock('table/row1', ttl=1)
+        row_without_ttl = RedisHierarchicalLock('table/row2')
+        row_with_ttl.acquire(blocking=False)
+        row_without_ttl.acquire(blocking=False)
+
+        # when
+        sleep(1.1)
+
+        # then
+        self.assertEqual(self.client.ttl('hlock:table'), -1)
+        self.assertFalse(RedisHierarchicalLock('table', mode='S').acquire(blocking=False))
+        row_without_ttl.release()
+        self.assertTrue(RedisHierarchicalLock('table', mode='S').acquire(blocking=False))
+
+    def test_should_not_extend_ancestor_holder_beyond_its_own_ttl(self):
+        # given
+        crashed_row = RedisHierarchicalLock('table/row1', ttl=1)
+        crashed_row.acquire(blocking=False)
+        RedisHierarchicalLock('table/row2', ttl=100).acquire(blocking=False)
+        RedisHierarchicalLock('table/row2').release(force=True)
+
+        # when
+        sleep(1.1)
+
+        # then
+        self.assertTrue(RedisHierarchicalLock('table').acquire(blocking=False))
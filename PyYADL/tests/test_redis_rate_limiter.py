@@ -0,0 +1,130 @@
+from unittest import TestCase
+from unittest.mock import patch, MagicMock, ANY
+
+from PyYADL import RedisTokenBucketRateLimiter, RedisSlidingWindowRateLimiter
+
+
+class TestRedisRateLimiter(TestCase):
+
+    @patch('PyYADL.redis_lock.StrictRedis')
+    @patch('PyYADL.rate_limiter.sleep')
+    def test_should_acquire_tokens_from_bucket(self, mock_sleep, mock_redis):
+        # given
+        script = MagicMock(return_value=b'0')
+        mock_redis.return_value.register_script.return_value = script
+        limiter = RedisTokenBucketRateLimiter('TestLimiter', capacity=10, rate=2.5, prefix='RateLimiterUnitTest')
+
+        # when
+        result = limiter.acquire(3)
+
+        # then
+        self.assertTrue(result)
+        script.assert_called_once_with(keys=['RateLimiterUnitTest:ratelimit:TestLimiter'], args=[10, 2.5, 3])
+        mock_sleep.assert_not_called()
+
+    @patch('PyYADL.redis_lock.StrictRedis')
+    @patch('PyYADL.rate_limiter.sleep')
+    def test_should_wait_computed_time_when_tokens_not_available(self, mock_sleep, mock_redis):
+        # given
+        script = MagicMock(side_effect=(b'0.4', b'0.05', b'0'))
+        mock_redis.return_value.register_script.return_value = script
+        limiter = RedisTokenBucketRateLimiter('TestLimiter', capacity=10, rate=5)
+
+        # when
+        result = limiter.acquire(2)
+
+        # then
+        self.assertTrue(result)
+        self.assertEqual(script.call_count, 3)
+        self.assertEqual([c[1][0] for c in mock_sleep.mock_calls], [0.4, 0.05])
+
+    @patch('PyYADL.redis_lock.StrictRedis')
+    @patch('PyYADL.rate_limiter.sleep')
+    def test_should_return_false_when_non_blocking_and_tokens_not_available(self, mock_sleep, mock_redis):
+        # given
+        mock_redis.return_value.register_script.return_value = MagicMock(return_value=b'0.4')
+        limiter = RedisTokenBucketRateLimiter('TestLimiter', capacity=10, rate=5)
+
+        # when
+        result = limiter.acquire(blocking=False)
+
+        # then
+        self.assertFalse(result)
+        mock_sleep.assert_not_called()
+
+    @patch('PyYADL.redis_lock.StrictRedis')
+    @patch('PyYADL.rate_limiter.sleep')
+    @patch('PyYADL.rate_limiter.time')
+    def test_should_not_wait_when_tokens_available_after_timeout(self, mock_time, mock_sleep, mock_redis):
+        # given
+        mock_redis.return_value.register_script.return_value = MagicMock(return_value=b'7.5')
+        mock_time.return_value = 1504732028
+        limiter = RedisTokenBucketRateLimiter('TestLimiter', capacity=10, rate=1)
+
+        # when
+        result = limiter.acquire(timeout=5)
+
+        # then
+        self.assertFalse(result)
+        mock_sleep.assert_not_called()
+
+    @patch('PyYADL.redis_lock.StrictRedis')
+    def test_should_raise_exception_when_requested_more_than_capacity(self, mock_redis):
+        # given
+        script = MagicMock(return_value=b'0')
+        mock_redis.return_value.register_script.return_value = script
+        limiter = RedisTokenBucketRateLimiter('TestLimiter', capacity=10, rate=1)
+
+        # when
+        with self.assertRaisesRegex(ValueError, 'cannot acquire more tokens than bucket capacity'):
+            limiter.acquire(11)
+
+        # then
+        script.assert_not_called()
+
+    @patch('PyYADL.redis_lock.StrictRedis')
+    @patch('PyYADL.rate_limiter.sleep')
+    def test_should_acquire_tokens_from_sliding_window(self, mock_sleep, mock_redis):
+        # given
+        script = MagicMock(side_effect=(b'0.25', b'0'))
+        mock_redis.return_value.register_script.return_value = script
+        limiter = RedisSlidingWindowRateLimiter('TestLimiter', limit=100, window=60)
+
+        # when
+        result = limiter.acquire(5)
+
+        # then
+        self.assertTrue(result)
+        script.assert_called_with(keys=['ratelimit:TestLimiter'], args=[100, 60, 5, ANY])
+        mock_sleep.assert_called_once_with(0.25)
+
+    @patch('PyYADL.redis_lock.StrictRedis')
+    def test_should_raise_exception_when_requested_non_positive_tokens(self, mock_redis):
+        # given
+        script = MagicMock(return_value=b'0')
+        mock_redis.return_value.register_script.return_value = script
+        bucket = RedisTokenBucketRateLimiter('TestLimiter', capacity=5, rate=1)
+        window = RedisSlidingWindowRateLimiter('TestLimiter', limit=5, window=1)
+
+        # when
+        with self.assertRaisesRegex(ValueError, 'tokens must be positive'):
+            bucket.acquire(-100)
+        with self.assertRaisesRegex(ValueError, 'tokens must be positive'):
+            window.acquire(0)
+
+        # then
+        script.assert_not_called()
+
+    @patch('PyYADL.redis_lock.StrictRedis')
+    def test_should_raise_exception_when_requested_fractional_tokens_from_sliding_window(self, mock_redis):
+        # given
+        script = MagicMock(return_value=b'0')
+        mock_redis.return_value.register_script.return_value = script
+        limiter = RedisSlidingWindowRateLimiter('TestLimiter', limit=5, window=1)
+
+        # when
+        with self.assertRaisesRegex(ValueError, 'tokens must be integer for sliding window'):
+            limiter.acquire(0.5)
+
+        # then
+        script.assert_not_called()
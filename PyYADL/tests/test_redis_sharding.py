@@ -0,0 +1,111 @@
+from unittest import TestCase
+from unittest.mock import patch, MagicMock
+
+from PyYADL import RedisShardedLockManager, RedisLock, RedisReadLock, RedisHierarchicalLock
+from PyYADL.redis_sharding import ConsistentHashRing
+
+
+class TestConsistentHashRing(TestCase):
+
+    def test_should_always_map_key_to_the_same_node(self):
+        # given
+        ring = ConsistentHashRing(['shard1', 'shard2', 'shard3'])
+
+        # when
+        nodes = {ring.get_node('TestLock') for _ in range(10)}
+
+        # then
+        self.assertEqual(len(nodes), 1)
+
+    def test_should_only_move_keys_to_new_node(self):
+        # given
+        ring = ConsistentHashRing(['shard1', 'shard2', 'shard3'])
+        keys = ['lock{0}'.format(i) for i in range(1000)]
+        before = {key: ring.get_node(key) for key in keys}
+
+        # when
+        ring.add_node('shard4')
+
+        # then
+        moved = [key for key in keys if ring.get_node(key) != before[key]]
+        self.assertTrue(0 < len(moved) < 500)
+        self.assertSetEqual({ring.get_node(key) for key in moved}, {'shard4'})
+
+    def test_should_restore_mapping_when_node_removed(self):
+        # given
+        ring = ConsistentHashRing(['shard1', 'shard2', 'shard3'])
+        keys = ['lock{0}'.format(i) for i in range(1000)]
+        before = {key: ring.get_node(key) for key in keys}
+        ring.add_node('shard4')
+
+        # when
+        ring.remove_node('shard4')
+
+        # then
+        self.assertDictEqual({key: ring.get_node(key) for key in keys}, before)
+
+    def test_should_raise_exception_when_ring_empty(self):
+        with self.assertRaisesRegex(RuntimeError, 'hash ring is empty'):
+            ConsistentHashRing().get_node('TestLock')
+
+
+class TestRedisShardedLockManager(TestCase):
+
+    @patch('PyYADL.redis_lock.StrictRedis')
+    def test_should_create_lock_on_shard_selected_by_name(self, mock_redis):
+        # given
+        pools = {'shard1': MagicMock(), 'shard2': MagicMock(), 'shard3': MagicMock()}
+        manager = RedisShardedLockManager(pools, prefix='ShardingUnitTest')
+        expected_pool = pools[ConsistentHashRing(pools).get_node('TestLock')]
+
+        # when
+        lock = manager.lock('TestLock', ttl=10)
+
+        # then
+        self.assertIsInstance(lock, RedisLock)
+        self.assertEqual(lock.LOCK_KEY, 'ShardingUnitTest:lock:TestLock')
+        self.assertEqual(lock.ttl, 10)
+        mock_redis.assert_called_once_with(connection_pool=expected_pool)
+
+    @patch('PyYADL.redis_lock.StrictRedis')
+    def test_should_create_read_and_write_locks_on_the_same_shard(self, mock_redis):
+        # given
+        manager = RedisShardedLockManager({'shard1': MagicMock(), 'shard2': MagicMock(), 'shard3': MagicMock()})
+
+        # when
+        read_lock = manager.read_lock('TestLock')
+        write_lock = manager.write_lock('TestLock')
+
+        # then
+        self.assertIsInstance(read_lock, RedisReadLock)
+        expected_pool = manager.get_connection_pool('TestLock')
+        self.assertIs(read_lock._connection_pool, expected_pool)
+        self.assertIs(write_lock._connection_pool, expected_pool)
+
+    @patch('PyYADL.redis_lock.StrictRedis')
+    def test_should_route_hierarchical_locks_by_root(self, mock_redis):
+        # given
+        pools = {'shard{0}'.format(i): MagicMock() for i in range(10)}
+        manager = RedisShardedLockManager(pools)
+
+        # when
+        locks = [manager.hierarchical_lock('table/partition{0}/row'.format(i)) for i in range(20)]
+
+        # then
+        self.assertIsInstance(locks[0], RedisHierarchicalLock)
+        expected_pool = manager.get_connection_pool('table')
+        for call in mock_redis.mock_calls:
+            if call[0] == '':
+                self.assertIs(call[2]['connection_pool'], expected_pool)
+
+    def test_should_name_shards_by_connection_parameters(self):
+        # given
+        pool1 = MagicMock(connection_kwargs={'host': 'redis1', 'port': 6379, 'db': 0})
+        pool2 = MagicMock(connection_kwargs={'host': 'redis2', 'port': 6379, 'db': 0})
+
+        # when
+        manager = RedisShardedLockManager([pool1, pool2])
+        manager.remove_shard('redis1:6379/0')
+
+        # then
+        self.assertIs(manager.get_connection_pool('TestLock'), pool2)
@@ -30,7 +30,7 @@ setup(
     packages=find_packages(),
     install_requires=['redis'],
     extras_require={
-        'test': ['coverage', 'nose', 'flake8'],
+        'test': ['coverage', 'nose', 'flake8', 'fakeredis[lua]'],
     },
     tests_require=['nose', 'coverage'],
     setup_requires=['setuptools_scm', 'wheel', 'twine'],